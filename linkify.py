@@ -1,18 +1,29 @@
+import os
 import sys
 import re
+import json
+import shutil
+import posixpath
 import logging
+import tempfile
+import functools
 import unicodedata
 
 from pathlib import Path
+from typing import Iterable, Optional
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
 
+# In safe mode, every note is copied to a backup folder next to the vault
+# before links are added to it
+SAFE_MODE = True
 
-def get_note_titles(vault_path: Path) -> list[str]:
+
+def get_note_titles(markdown_files: list[Path]) -> list[str]:
     """
-    Reads note titles from the Obsidian vault.
+    Reads note titles from the markdown files of the Obsidian vault.
     Assuming each note's title is its filename without the extension.
-    Excludes dot folders like .obsidian.
     """
-    markdown_files = get_markdown_files(vault_path)
     note_titles = [file.stem for file in markdown_files]
     return note_titles
 
@@ -21,17 +32,225 @@ def get_markdown_files(vault_path: Path) -> list[Path]:
     """
     Get all markdown files in the vault.
     """
-    markdown_files = list(vault_path.glob("**/*.md"))
-    # filter out dot folders like .obsidian
-    # both for Unix and Windows paths
-    markdown_files = [
-        file
-        for file in markdown_files
-        if not "/." in str(file) and not "\." in str(file)
-    ]
+    markdown_files, _, _ = walk_vault(vault_path)
     return markdown_files
 
 
+def list_folder(directory: str) -> tuple[int, list[str], list[Path]]:
+    """
+    Lists a folder of the vault: its modification time, its sub folders and its
+    markdown files. Dot files and folders like .obsidian are left out.
+    Raises OSError if the folder can't be read.
+    """
+    sub_directories = []
+    markdown_files = []
+    # the modification time is read before the folder is listed, so that
+    # a file added in the meantime makes it outdated rather than missed
+    mtime = os.stat(directory).st_mtime_ns
+    # the entries of os.scandir already know whether they are folders,
+    # so listing a folder doesn't need a stat call per file
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
+                continue
+            # symlinked folders are not followed, like Path.glob did:
+            # their notes would be listed twice, or endlessly in a cycle
+            if entry.is_dir(follow_symlinks=False):
+                sub_directories.append(entry.path)
+            elif name.endswith(".md"):
+                markdown_files.append(Path(entry.path))
+    return mtime, sub_directories, markdown_files
+
+
+def is_listed_note(vault_path: Path, file: Path) -> bool:
+    """
+    Tells whether a file of the vault is one of the notes listed by walk_vault:
+    a markdown file outside of dot folders.
+    """
+    return file.name.endswith(".md") and not any(
+        part.startswith(".") for part in file.relative_to(vault_path).parts
+    )
+
+
+def walk_vault(vault_path: Path) -> tuple[list[Path], dict[Path, int], list[Path]]:
+    """
+    Get all markdown files in the vault, and the folders walked to find them
+    with their modification time, and the folders skipped as they can't be read.
+    Dot folders are never descended into.
+    """
+    markdown_files = []
+    directories = {}
+    skipped_directories = []
+
+    def walk(directory: str):
+        try:
+            mtime, sub_directories, directory_markdown_files = list_folder(directory)
+        except OSError as e:
+            logging.warning(f"🔴 Skipping unreadable folder {directory}: {e}")
+            skipped_directories.append(Path(directory))
+            return
+        directories[Path(directory)] = mtime
+        markdown_files.extend(directory_markdown_files)
+        # the folder is closed before walking its sub folders, so that deep
+        # vaults don't keep a file descriptor open per level
+        for sub_directory in sub_directories:
+            walk(sub_directory)
+
+    walk(os.fspath(vault_path))
+    return markdown_files, directories, skipped_directories
+
+
+# to be increased whenever the way the titles are prepared changes, so that
+# the index saved by an older version is not used
+VAULT_INDEX_VERSION = 1
+
+
+def get_vault_index_path(vault_path: Path) -> Path:
+    """
+    The vault index is kept in the .obsidian folder, which is not walked, so that
+    writing it doesn't change the modification time of the vault folders.
+    """
+    return vault_path / ".obsidian" / "linkify_index.json"
+
+
+def read_vault_index(index_path: Path) -> Optional[dict]:
+    """
+    Reads the vault index saved by save_vault_index.
+    Returns None if it was saved by another version or doesn't have the
+    expected shape, e.g. if it was edited by hand.
+    """
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    if not isinstance(index, dict) or index.get("version") != VAULT_INDEX_VERSION:
+        return None
+    expected_types = {
+        "directories": dict,
+        "markdown_files": list,
+        "sorted_titles": list,
+        "acronyms": dict,
+    }
+    for key, expected_type in expected_types.items():
+        if not isinstance(index.get(key), expected_type):
+            return None
+    # the items are checked too, a wrong one would make the run fail later on
+    items_are_valid = (
+        all(isinstance(mtime, int) for mtime in index["directories"].values())
+        and all(isinstance(file, str) for file in index["markdown_files"])
+        and all(isinstance(title, str) for title in index["sorted_titles"])
+        and all(
+            isinstance(acronym, str) and isinstance(title, str)
+            for acronym, title in index["acronyms"].items()
+        )
+    )
+    return index if items_are_valid else None
+
+
+def load_vault_index(
+    vault_path: Path,
+) -> Optional[tuple[list[Path], tuple[str, ...], dict[str, str]]]:
+    """
+    Loads the markdown files and the prepared titles saved by a previous run.
+    The modification time of a folder changes whenever a file is added, removed
+    or renamed in it, so if no folder changed, the notes are the same as when
+    the index was saved, and the vault doesn't need to be walked again.
+    Returns None if there is no index or if it is outdated.
+    """
+    try:
+        index = read_vault_index(get_vault_index_path(vault_path))
+        if index is None:
+            logging.debug("🗂️ Vault index outdated: saved by another version or malformed")
+            return None
+        for directory, mtime in index["directories"].items():
+            if (vault_path / directory).stat().st_mtime_ns != mtime:
+                logging.debug("🗂️ Vault index outdated: %s changed", directory)
+                return None
+        markdown_files = [vault_path / file for file in index["markdown_files"]]
+        return markdown_files, tuple(index["sorted_titles"]), index["acronyms"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.debug("🗂️ No vault index loaded: %s", e)
+        return None
+
+
+def save_vault_index(
+    vault_path: Path,
+    directories: dict[Path, int],
+    markdown_files: list[Path],
+    sorted_titles: tuple[str, ...],
+    acronyms: dict[str, str],
+):
+    """
+    Saves the markdown files and the prepared titles for the next runs,
+    with the modification times of the folders returned by walk_vault.
+    Nothing is saved if the vault has no .obsidian folder.
+    """
+    index_path = get_vault_index_path(vault_path)
+    if not index_path.parent.is_dir():
+        return
+    try:
+        index = {
+            "version": VAULT_INDEX_VERSION,
+            "directories": {
+                directory.relative_to(vault_path).as_posix(): mtime
+                for directory, mtime in directories.items()
+            },
+            "markdown_files": [
+                file.relative_to(vault_path).as_posix() for file in markdown_files
+            ],
+            "sorted_titles": sorted_titles,
+            "acronyms": acronyms,
+        }
+        write_file_atomically(index_path, json.dumps(index).encode("utf-8"))
+    except OSError as e:
+        logging.warning(f"🔴 Error saving the vault index {index_path}: {e}")
+
+
+def refresh_vault_index(vault_path: Path, written_files: list[Path]):
+    """
+    Updates the vault index once notes were written: replacing a file changes
+    the modification time of its folder, which would make the next run walk
+    the vault again.
+    Only the folders of the written files are listed again, and the index is
+    only updated if they still hold the indexed notes and folders.
+    """
+    index_path = get_vault_index_path(vault_path)
+    try:
+        index = read_vault_index(index_path)
+        if index is None:
+            return
+        indexed_directories = index["directories"]
+        indexed_files = index["markdown_files"]
+        # a symlinked note has the folder of its target changed, the paths are
+        # resolved the same way as in write_file_atomically
+        real_vault_path = Path(os.path.realpath(vault_path))
+        written_directories = {
+            Path(os.path.realpath(file)).parent for file in written_files
+        }
+        for directory in written_directories:
+            relative_directory = directory.relative_to(real_vault_path).as_posix()
+            if relative_directory not in indexed_directories:
+                return
+            mtime, sub_directories, markdown_files = list_folder(os.fspath(directory))
+            listed = {
+                Path(path).relative_to(real_vault_path).as_posix()
+                for path in sub_directories + markdown_files
+            }
+            indexed = {
+                path
+                for paths in (indexed_directories, indexed_files)
+                for path in paths
+                if path != "." and (posixpath.dirname(path) or ".") == relative_directory
+            }
+            if listed != indexed:
+                logging.debug(
+                    "🗂️ Vault index not refreshed: %s changed", relative_directory
+                )
+                return
+            indexed_directories[relative_directory] = mtime
+        write_file_atomically(index_path, json.dumps(index).encode("utf-8"))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.debug("🗂️ Vault index not refreshed: %s", e)
+
+
 def separate_acronyms_and_classic_titles(
     titles: list[str],
 ) -> tuple[list[str], list[str]]:
@@ -46,142 +265,416 @@ def separate_acronyms_and_classic_titles(
         # transform the title into a accronym
         simpler_title = simplified_string(title)
         potential_acronym = "".join(
-            [word[0].upper() for word in simpler_title.split("_")]
+            # consecutive spaces or dashes give empty words
+            [word[0].upper() for word in simpler_title.split("_") if word]
         )
         if len(potential_acronym) > 1 and potential_acronym not in acronyms:
             acronyms[potential_acronym] = title
 
-    logging.debug(f"🔠 Acronyms: {acronyms}")
-    logging.debug(f"📚 Classic titles: {classic_titles}")
+    logging.debug("🔠 Acronyms: %s", acronyms)
+    logging.debug("📚 Classic titles: %s", classic_titles)
 
     return acronyms, classic_titles
 
 
+# Markers of the sections that should not be linkified, each one is ended
+# by the same marker. Table rows are handled separately since they are
+# delimited by the line.
+CODE_BLOCK_MARKER = "```"
+MATH_BLOCK_MARKER = "$$"
+INLINE_MATH_MARKER = "$"
+TABLE_ROW_MARKER = "|"
+
+
+def find_table_row(text: str, start: int) -> int:
+    """
+    Returns the index of the next line of the text starting at or after start
+    that begins with a "|", or -1 if there is none.
+    """
+    if start == 0 and text.startswith(TABLE_ROW_MARKER):
+        return 0
+    position = text.find("\n" + TABLE_ROW_MARKER, max(start - 1, 0))
+    return position + 1 if position != -1 else -1
+
+
 def split_text_for_linkification(text: str) -> list[tuple[str, bool]]:
     """
     Some sections of the text should not be linkified.
     This is especially the case with math blocks, and code blocks.
     This function splits the text into linkifiable and non-linkifiable sections.
-    """
-    # Split the text into sections that should be linkified and those that should not
-    split_text = re.split(
-        r'''
-        (```.*?```                     # Code blocks (```...```)
-        |(?<!`)\$\$.*?\$\$             # Multiline math blocks ($$...$$)
-        |(?<!`)\$.*?\$                 # Inline math blocks ($...$)
-        |^\|.*\|$                      # Table rows starting and ending with |
-        )
-    ''', text, flags= re.VERBOSE | re.MULTILINE | re.DOTALL)
 
-    # Keep track of whether each section should be linkified
+    The text is scanned once: at each step the closest marker is located with
+    str.find, then the end of its section, so an unclosed marker costs a
+    single search instead of making a regex retry the rest of the text.
+    """
     linkifiable_sections = []
-    for i, section in enumerate(split_text):
-        # Sections that should not be linkified are math blocks, code blocks and tables
-        linkifiable = not (section.startswith("```") or section.startswith("$") or section.startswith("|"))
-        linkifiable_sections.append((section, linkifiable))
+    section_start = 0  # start of the current linkifiable section
+    position = 0  # where to look for the next marker
+    next_code_block = text.find(CODE_BLOCK_MARKER)
+    next_math = text.find(INLINE_MATH_MARKER)
+    next_table_row = find_table_row(text, 0)
 
+    while True:
+        # the positions of the markers are only searched again once passed
+        if -1 < next_code_block < position:
+            next_code_block = text.find(CODE_BLOCK_MARKER, position)
+        if -1 < next_math < position:
+            next_math = text.find(INLINE_MATH_MARKER, position)
+        if -1 < next_table_row < position:
+            next_table_row = find_table_row(text, position)
+
+        candidates = [m for m in (next_code_block, next_math, next_table_row) if m != -1]
+        if not candidates:
+            break
+        marker_start = min(candidates)
+        section_end = -1
+
+        if marker_start == next_code_block:
+            # Code blocks (```...```)
+            closing = text.find(CODE_BLOCK_MARKER, marker_start + 3)
+            if closing != -1:
+                section_end = closing + 3
+        elif marker_start == next_math:
+            # Math blocks ($$...$$ and $...$), not when escaped by a backtick
+            if marker_start == 0 or text[marker_start - 1] != "`":
+                if text.startswith(MATH_BLOCK_MARKER, marker_start):
+                    closing = text.find(MATH_BLOCK_MARKER, marker_start + 2)
+                    if closing != -1:
+                        section_end = closing + 2
+                if section_end == -1:
+                    closing = text.find(INLINE_MATH_MARKER, marker_start + 1)
+                    if closing != -1:
+                        section_end = closing + 1
+        else:
+            # Table rows starting and ending with |
+            line_end = text.find("\n", marker_start)
+            if line_end == -1:
+                line_end = len(text)
+            row = text[marker_start:line_end].rstrip("\r")
+            if len(row) > 1 and row.endswith(TABLE_ROW_MARKER):
+                section_end = marker_start + len(row)
+
+        if section_end == -1:
+            # the marker isn't closed, it is part of the linkifiable text
+            position = marker_start + 1
+            continue
+
+        linkifiable_sections.append((text[section_start:marker_start], True))
+        linkifiable_sections.append((text[marker_start:section_end], False))
+        section_start = position = section_end
+
+    linkifiable_sections.append((text[section_start:], True))
     return linkifiable_sections
 
 
-def linkify_text(text: str, note_titles: list[str], file_title=None) -> tuple[str, int]:
+# Escape titles for regex, add word boundaries, and handle an optional 's' at the end
+# example: (\b|\[\[)TODO(\B|\]\])
+# example V2: (\b|\[\[)TODOs?(\]\])?s?(?![\w])
+# example V3: (\b|\[\[)TODO(?:s?(\]\])s?|s)?(?![\w])
+# current, on Python 3.11+ (see DECORATION_END for the form used before):
+# (?P<open>\b|\[\[)TODO(?:S?+(?P<close>\]\])S?+|S)?+(?![\w])
+# where S is ACRONYMS_PLURAL_SUFFIX when the vault has acronyms, else "s"
+# the groups are named, since the acronyms group is only there if the vault
+# has acronyms
+# the suffix is written so that each input can only be matched one way: with V2
+# a lone 's' could be taken by either 's?', so a failed match was retried
+# twice, and "ss" was accepted (the note "Cla" would link "Class")
+DECORATION_START = r"(?P<open>\b|\[\[)"
+if sys.version_info >= (3, 11):
+    # possessive quantifiers are supported since Python 3.11: once the suffix
+    # is matched, the engine doesn't backtrack into it when the word goes on
+    DECORATION_END = r"(?:{s}?+(?P<close>\]\]){s}?+|{s})?+(?![\w])"
+else:
+    # same matches without possessive quantifiers: the suffix can't be
+    # reduced to a bare 's' or to nothing when the link end follows it,
+    # otherwise "[[foo todos]]x" would have the note "todo" linked inside
+    DECORATION_END = r"(?:{s}?(?P<close>\]\]){s}?|(?!{s}?\]\]){s}?)(?![\w])"
+# the suffix is matched regardless of case like the titles, except after an
+# acronym: "MLs" is the plural of "ML", "MLS" is another acronym
+PLURAL_SUFFIX = "s"
+ACRONYMS_PLURAL_SUFFIX = r"(?(acronym)(?-i:s)|s)"
+
+
+def titles_to_regex(titles: list[str]) -> str:
+    """
+    Builds a regex matching any of the titles, with their common prefixes shared.
+    The titles are stored in a trie (one node per character), which is then
+    turned into nested groups, e.g. "machine learning" and "machine" give
+    "machine(?: learning)?".
+    This way the regex engine doesn't try every title one after the other at
+    each position of the text, but walks down a path of the trie.
+    The optional groups are greedy, so the longest match is still preferred.
+    """
+    trie = {}
+    for title in titles:
+        node = trie
+        for char in title:
+            node = node.setdefault(char, {})
+        # an empty key marks the end of a title
+        node[""] = {}
+    return trie_to_regex(trie)
+
+
+def trie_to_regex(node: dict) -> str:
     """
-    Replaces occurrences of note titles in the text with [[note-title]] links.
-    Prefers the longest match.
+    Turns a trie node built by titles_to_regex into a regex.
     """
-    # we remove the file title from the note titles to avoid linking to the current file
-    if file_title:
-        note_titles = [title for title in note_titles if title != file_title]
+    branches = []
+    for char, child in node.items():
+        if not char:
+            continue
+        # the characters of a chain without branching are gathered in a single
+        # join, instead of one recursion and one concatenation per character
+        chain = [char]
+        while len(child) == 1 and "" not in child:
+            char, child = next(iter(child.items()))
+            chain.append(char)
+        branches.append(re.escape("".join(chain)) + trie_to_regex(child))
+    if not branches:
+        return ""
+    if "" not in node:
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+    # a title ends at this node, what follows is optional
+    return "(?:" + "|".join(branches) + ")?"
+
 
+def compile_titles_pattern(
+    title_lookup: dict[str, str], acronyms: dict[str, str]
+) -> re.Pattern:
+    """
+    Compiles a single pattern matching any of the note titles and acronyms,
+    so that the text is scanned once whatever the number of titles.
+    The "title" group is the matched title, the "acronym" group the matched acronym,
+    each group is only in the pattern if there are titles or acronyms to match.
+    The pattern is meant to be used on a text folded by fold_accents.
+    """
+    branches = []
+    if title_lookup:
+        # without titles, the empty group would match at every word boundary
+        branches.append("(?P<title>" + titles_to_regex(title_lookup) + ")")
+    if acronyms:
+        # unlike titles, acronyms are matched with their case: "ML" is an
+        # acronym, "ml" is not
+        branches.append("(?-i:(?P<acronym>" + titles_to_regex(acronyms) + "))")
+        decoration_end = DECORATION_END.format(s=ACRONYMS_PLURAL_SUFFIX)
+    else:
+        decoration_end = DECORATION_END.format(s=PLURAL_SUFFIX)
+    pattern = re.compile(
+        DECORATION_START + "(?:" + "|".join(branches) + ")" + decoration_end,
+        flags=re.IGNORECASE,
+    )
+    logging.debug("Titles pattern: %s", pattern.pattern)
+    return pattern
+
+
+def prepare_titles(note_titles: list[str]) -> tuple[tuple[str, ...], dict[str, str]]:
+    """
+    Prepares the note titles for build_linkifier.
+    """
     # We need to distinguish the classic note title from acronyms note titles
     # Acronyms are only uppercase letters, and replacement should be done with the same case
     acronyms, classic_titles = separate_acronyms_and_classic_titles(note_titles)
 
     # Sort titles by length in descending order to prefer longest match
-    sorted_titles = sorted(classic_titles, key=len, reverse=True)
-    nb_new_links = 0
+    sorted_titles = tuple(sorted(classic_titles, key=len, reverse=True))
+    return sorted_titles, acronyms
 
-    def replacement(match, title=None):
-        original_text = match.group(0)
 
-        # don't modify the text if it's already a link
-        if "[[" in original_text or "]]" in original_text:
-            return original_text
-        else:
-            # Check if the matched text ends with 's', include it in the link if not
-            if (
-                original_text.lower().endswith("s")
-                and original_text[:-1] in sorted_titles
-            ):
-                linkified = f"[[{original_text[:-1]}]]s"
+@dataclass(frozen=True)
+class Linkifier:
+    """
+    Links note titles in texts.
+    It only depends on the vault, so it is built once by build_linkifier and
+    then applied to every file to linkify.
+    """
+
+    pattern: re.Pattern
+    # folded and lowercased title -> note title
+    title_lookup: dict[str, str]
+    # acronym -> note title
+    acronyms: dict[str, str]
+
+    def apply(self, text: str, file_title=None) -> tuple[str, int]:
+        """
+        Replaces occurrences of note titles in the text with [[note-title]] links.
+        Prefers the longest match.
+        Returns the linked text and the number of new links.
+        """
+        if not self.title_lookup and not self.acronyms:
+            return text, 0
+        # a single note may hold acronyms but no title, then the pattern has no
+        # "title" group
+        has_titles = bool(self.title_lookup)
+
+        # titles are searched in the text without accents, so that "régression"
+        # is linked to "Regression", but the links keep the original text:
+        # folding keeps the positions, so the matches are sliced from the text
+        folded_text = fold_accents(text)
+        nb_new_links = 0
+        linked_sections = []
+        last_end = 0
+        for match in self.pattern.finditer(folded_text):
+            # don't modify the text if it's already a link, the match is
+            # simply left in the text between the links
+            if match.group("open") or match.group("close") is not None:
+                continue
+            folded_title = match.group("title") if has_titles else None
+            if folded_title is not None:
+                title_start, title_end = match.span("title")
+                matched_text = text[title_start:title_end]
+                title = self.title_lookup.get(folded_title.lower())
+                if title is None:
+                    # re.IGNORECASE also matches characters that don't
+                    # lowercase to the title, e.g. "ſun" for "Sun"
+                    continue
             else:
-                if title and title != original_text:
-                    linkified = f"[[{title}|{original_text}]]"
-                else:
-                    linkified = f"[[{original_text}]]"
+                title_start, title_end = match.span("acronym")
+                matched_text = text[title_start:title_end]
+                title = self.acronyms[match.group("acronym")]
+            # avoid linking to the current file
+            if title == file_title:
+                continue
 
-            nonlocal nb_new_links
+            linked_sections.append(text[last_end:title_start])
+            if title == matched_text:
+                linked_sections.append(f"[[{title}]]")
+            else:
+                linked_sections.append(f"[[{title}|{matched_text}]]")
+            # the match only goes past the title for a plural 's', which is
+            # kept out of the link with the text that follows
+            last_end = title_end
             nb_new_links += 1
-            return linkified
+        linked_sections.append(text[last_end:])
+        linked_text = "".join(linked_sections)
 
-    # Escape titles for regex, add word boundaries, and handle an optional 's' at the end
-    # example: (\b|\[\[)TODO(\B|\]\])
-    # example V2: (\b|\[\[)TODOs?(\]\])?s?(?![\w])
-    decoration_start = r"(\b|\[\[)"
-    decoration_end = r"s?(\]\])?s?(?![\w])"
+        return linked_text, nb_new_links
 
-    # a dict to store the title and the pattern
-    pattern_collection = {
-        title: decoration_start + re.escape(title) + decoration_end
+
+def select_titles_in_text(
+    text: str, sorted_titles: tuple[str, ...], acronyms: dict[str, str]
+) -> tuple[tuple[str, ...], dict[str, str]]:
+    """
+    Keeps only the titles and acronyms that can be found in the text.
+    Most titles of a vault never appear in a given note, and searching each of
+    them with str.find is much cheaper than compiling them all in the pattern.
+    Titles are compared casefolded and without accents, so that no title that
+    the pattern would match is dropped.
+    """
+    folded_text = fold_accents(text)
+    casefolded_text = folded_text.casefold()
+    titles_in_text = tuple(
+        title
         for title in sorted_titles
+        if fold_accents(title).casefold() in casefolded_text
+    )
+    acronyms_in_text = {
+        acronym: title for acronym, title in acronyms.items() if acronym in folded_text
     }
+    return titles_in_text, acronyms_in_text
 
-    # Use a regex to replace titles in the text with their linkified versions
-    linked_text = text
-    for title, pattern in pattern_collection.items():
-        logging.debug(f"Title: {title}, Pattern: {pattern}")
-        linked_text = re.sub(
-            pattern,
-            lambda match: replacement(match, title),
-            linked_text,
-            flags=re.IGNORECASE,
-        )
 
-    if len(acronyms) == 0:
-        return linked_text
+def build_linkifier(
+    sorted_titles: tuple[str, ...], acronyms: dict[str, str]
+) -> Linkifier:
+    """
+    Builds the linkifier of the titles and acronyms returned by prepare_titles.
+    """
+    title_lookup = {}
+    for title in sorted_titles:
+        title_lookup.setdefault(fold_accents(title).lower(), title)
+    return Linkifier(
+        pattern=compile_titles_pattern(title_lookup, acronyms),
+        title_lookup=title_lookup,
+        acronyms=acronyms,
+    )
 
-    # Handle acronyms separately because they don't need word boundaries in the same way
-    logging.debug(f"Acronyms: {acronyms}")
-    acronyms_pattern_collection = {
-        acronym: decoration_start + acronym + decoration_end
-        for acronym in acronyms.keys()
-    }
-    # logging.debug(f"Pattern acronyms: {acronyms_pattern_collection}")
-    for acronym, pattern, title in zip(
-        acronyms.keys(), acronyms_pattern_collection.values(), acronyms.values()
-    ):
-        logging.debug(f"Acronym: {acronym}, Pattern: {pattern}, Title: {title}")
-        linked_text = re.sub(
-            pattern, lambda match: replacement(match, title), linked_text, re.IGNORECASE
-        )
 
-    return linked_text, nb_new_links
+# Word separators replaced by underscores in simplified strings
+SIMPLIFY_TABLE = str.maketrans({" ": "_", "-": "_"})
 
 
+@functools.lru_cache(maxsize=None)
 def simplified_string(s: str) -> str:
     """
     Simplifies a string by removing accents, converting to lowercase, and replacing spaces with underscores.
     """
-    s = remove_accents(s).decode("utf-8")
-    return s.casefold().replace(" ", "_").replace("-", "_")
+    return remove_accents(s).casefold().translate(SIMPLIFY_TABLE)
 
 
-def remove_accents(input_str: str) -> bytes:
+class CombiningMarksTable(dict):
+    """
+    Translation table for str.translate, deleting the combining marks (accents)
+    of a decomposed string. A character is only looked up the first time it is met.
+    """
+
+    def __missing__(self, code_point: int) -> Optional[int]:
+        mapped = None if unicodedata.combining(chr(code_point)) else code_point
+        self[code_point] = mapped
+        return mapped
+
+
+COMBINING_MARKS_TABLE = CombiningMarksTable()
+
+
+@functools.lru_cache(maxsize=None)
+def remove_accents(input_str: str) -> str:
     """
     Removes accents from a string.
+    Only the combining marks are dropped, letters with no ASCII equivalent
+    (e.g. greek or cyrillic ones) are kept.
     """
+    if input_str.isascii():
+        return input_str
     nfkd_form = unicodedata.normalize("NFKD", input_str)
-    only_ascii = nfkd_form.encode("ASCII", "ignore")
-    return only_ascii
+    return nfkd_form.translate(COMBINING_MARKS_TABLE)
+
+
+# Marks that tell words apart rather than accent them: the Vietnamese hook
+# above, dot below and horn (other Vietnamese tones share their marks with
+# french or spanish accents, and are folded with them)
+KEPT_COMBINING_MARKS = frozenset("\u0309\u0323\u031b")
+
+
+class AccentFoldingTable(dict):
+    """
+    Translation table for str.translate, mapping characters to their unaccented form.
+    Only latin letters with a single accent are folded: in other scripts the
+    marks make other letters (e.g. the japanese dakuten of "が"), and stacked
+    marks are vietnamese tones.
+    Each character is mapped to exactly one character, so that the folded text
+    has the same positions as the original text. Characters that can't be folded
+    this way (e.g. ligatures) are kept as they are.
+    A character is only decomposed the first time it is met.
+    """
+
+    def __missing__(self, code_point: int) -> str:
+        char = chr(code_point)
+        folded = char
+        decomposed = unicodedata.normalize("NFD", char)
+        if len(decomposed) == 2:
+            base, mark = decomposed
+            if (
+                unicodedata.combining(mark)
+                and mark not in KEPT_COMBINING_MARKS
+                and unicodedata.name(base, "").startswith("LATIN ")
+            ):
+                folded = base
+        self[code_point] = folded
+        return folded
+
+
+ACCENT_FOLDING_TABLE = AccentFoldingTable()
+
+
+def fold_accents(text: str) -> str:
+    """
+    Removes accents from a text, keeping one character per character.
+    """
+    if text.isascii():
+        return text
+    return text.translate(ACCENT_FOLDING_TABLE)
 
 
 def setup_logging(log_filename: Path = None):
@@ -202,26 +695,164 @@ def setup_logging(log_filename: Path = None):
     )
 
 
-def copy_files_to_somewhere_else(destination: Path, *files: list[Path], **kwargs):
+def backup_file(destination: Path, file: Path, content: bytes, vault_path: Path):
     """
-    Copy files to a destination folder.
+    Saves the content of a file of the vault in a destination folder, at the
+    same path relative to the vault, so that notes with the same name in
+    different folders each get their backup.
+    A backup that already exists is kept, so that it stays the oldest version
+    of the file.
     """
+    destination_file = destination / file.relative_to(vault_path)
+    destination_file.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # the "x" mode fails if the file exists, without a separate check
+        with open(destination_file, "xb") as backup:
+            backup.write(content)
+        logging.debug("📋 Copied file: %s", destination_file)
+    except FileExistsError:
+        logging.debug("🔴 File already exists: %s", destination_file)
 
-    for file in files:
+
+def linkify_file(
+    file_to_linkify_path: Path,
+    linkifier: Linkifier,
+    backup_folder: Optional[Path] = None,
+    vault_path: Optional[Path] = None,
+    content: Optional[bytes] = None,
+) -> tuple[Optional[str], int]:
+    """
+    Linkifies the text of a markdown file of the vault, without writing it.
+    If a backup folder is given, the file is saved there before it gets
+    new links, from the bytes read to linkify it, at its path in the vault.
+    The content of the file can be given if it was already read.
+    Returns the linked text, or None if there is nothing to write,
+    and the number of new backlinks.
+    """
+    nb_new_backlinks = 0
+    try:
+        # read as bytes so that the line endings aren't translated, the file is
+        # written back with the ones it had
+        if content is None:
+            content = file_to_linkify_path.read_bytes()
+        text = content.decode("utf-8")
+
+        file_title = Path(file_to_linkify_path).stem
+        linkifiable_sections = split_text_for_linkification(text)
+        linked_sections = []
+        for section, linkifiable in linkifiable_sections:
+            if linkifiable:
+                linked_text, nb_new_links = linkifier.apply(section, file_title)
+                linked_sections.append(linked_text)
+                nb_new_backlinks += nb_new_links
+            else:
+                linked_sections.append(section)
+
+        if nb_new_backlinks and backup_folder is not None:
+            # if the backup fails, the error is caught below and the file is
+            # left as it is
+            backup_file(backup_folder, file_to_linkify_path, content, vault_path)
+    except Exception as e:
+        logging.error(f"🔴 Error processing file {file_to_linkify_path.stem}: {e}")
+        print(f"Error processing file {file_to_linkify_path.stem}: {e}")
+        return None, 0
+
+    if nb_new_backlinks == 0:
+        # the text is unchanged, the file doesn't need to be written
+        return None, 0
+    return "".join(linked_sections), nb_new_backlinks
+
+
+def write_file_atomically(file: Path, content: bytes):
+    """
+    Writes a file through a temporary file in the same folder, which then
+    replaces it, so that the file is never left half written if the script
+    is interrupted.
+    The temporary file name starts with a dot, so it is never taken for a note.
+    A symlinked file has its target replaced, the symlink is kept.
+    The replaced file gets a new creation time on the systems that keep one
+    (macOS, Windows), only its content and permissions are kept.
+    """
+    file = Path(os.path.realpath(file))
+    temporary_file = tempfile.NamedTemporaryFile(
+        dir=file.parent, prefix=f".{file.name}.", suffix=".tmp", delete=False
+    )
+    try:
+        with temporary_file:
+            temporary_file.write(content)
+        if file.exists():
+            # the temporary file is only readable by its owner
+            shutil.copymode(file, temporary_file.name)
+        os.replace(temporary_file.name, file)
+    except BaseException:
+        os.unlink(temporary_file.name)
+        raise
+
+
+def write_linked_files(
+    files_to_linkify_path: list[Path],
+    linked_results: Iterable[tuple[Optional[str], int]],
+    in_place: bool = False,
+) -> tuple[int, list[Path]]:
+    """
+    Writes the linked texts returned by linkify_file to their files, in order.
+    The files are written in place if asked, which keeps their creation time,
+    otherwise through write_file_atomically.
+    Returns the total number of new backlinks and the files written.
+    """
+    nb_new_backlinks = 0
+    written_files = []
+    for file_to_linkify_path, (linked_text, nb_new_links) in zip(
+        files_to_linkify_path, linked_results
+    ):
+        if linked_text is None:
+            continue
         try:
-            file_name = file.name
-            destination_file = destination / file_name
-            if destination_file.exists():
-                logging.debug(f"🔴 File already exists: {destination_file}")
-                continue
-            with open(file, "r", **kwargs) as f:
-                text = f.read()
-            with open(destination_file, "w", **kwargs) as f:
-                f.write(text)
-            logging.debug(f"📋 Copied file: {destination_file}")
+            if in_place:
+                file_to_linkify_path.write_bytes(linked_text.encode("utf-8"))
+            else:
+                write_file_atomically(file_to_linkify_path, linked_text.encode("utf-8"))
+            nb_new_backlinks += nb_new_links
+            written_files.append(file_to_linkify_path)
+            logging.debug("🔗 Linkified file: %s", file_to_linkify_path.stem)
         except Exception as e:
-            logging.error(f"🔴 Error copying file {file}: {e}")
-            print(f"Error copying file {file}: {e}")
+            logging.error(f"🔴 Error writing file {file_to_linkify_path.stem}: {e}")
+            print(f"Error writing file {file_to_linkify_path.stem}: {e}")
+    return nb_new_backlinks, written_files
+
+
+# Below this number of files, starting worker processes costs more than it saves
+MIN_FILES_FOR_PARALLELISM = 32
+
+# State of a worker process, set once by init_worker
+_worker_linkifier = None
+_worker_backup_folder = None
+_worker_vault_path = None
+
+
+def init_worker(
+    sorted_titles: tuple[str, ...],
+    acronyms: dict[str, str],
+    backup_folder: Optional[Path] = None,
+    vault_path: Optional[Path] = None,
+):
+    """
+    Builds the linkifier of a worker process, so that the titles are not sent
+    along with every file, and the titles pattern is compiled once per worker.
+    """
+    global _worker_linkifier, _worker_backup_folder, _worker_vault_path
+    _worker_linkifier = build_linkifier(sorted_titles, acronyms)
+    _worker_backup_folder = backup_folder
+    _worker_vault_path = vault_path
+
+
+def linkify_file_in_worker(file_to_linkify_path: Path) -> tuple[Optional[str], int]:
+    """
+    Linkifies a file from a worker process set up by init_worker.
+    """
+    return linkify_file(
+        file_to_linkify_path, _worker_linkifier, _worker_backup_folder, _worker_vault_path
+    )
 
 
 def main():
@@ -233,16 +864,15 @@ def main():
     obsidian_script_used = nb_args == 3
     no_specified_file = None
     note_titles = None
-    safe_mode = True
 
     if obsidian_script_used:
         python_script = sys.argv[0]
         vault_path = Path(sys.argv[1])
         file_path = vault_path / sys.argv[2]
 
-        logging.debug(f"python_script: {python_script}")
-        logging.debug(f"📂 Vault path: {vault_path.absolute()}")
-        logging.debug(f"📋 Parsing file: {file_path}")
+        logging.debug("python_script: %s", python_script)
+        logging.debug("📂 Vault path: %s", vault_path.absolute())
+        logging.debug("📋 Parsing file: %s", file_path)
 
         if not vault_path.exists():
             logging.error(f"🔴 Vault path does not exist: {vault_path}")
@@ -258,59 +888,119 @@ def main():
                 f"🔴 No Specific file given, all files in the vault will be linkify"
             )
             print(f"No Specific file given, all files in the vault will be linkify")
-            files_to_linkify_path = get_markdown_files(vault_path)
         else:
             print(f'Running linkify script on "{file_path.stem}"')
-            files_to_linkify_path = [file_path]
 
-        note_titles = get_note_titles(vault_path)
-        if not note_titles:
-            logging.error(f"🔴 No markdown files found in the vault: {vault_path}")
-            print(f"No markdown files found in the vault: {vault_path}")
-            return
+        # the vault is only walked and its titles prepared again if notes
+        # were added, removed or renamed since the previous run
+        vault_index = load_vault_index(vault_path)
+        if (
+            vault_index is not None
+            and not no_specified_file
+            and is_listed_note(vault_path, file_path)
+            and file_path not in vault_index[0]
+        ):
+            # some filesystems (FAT, exFAT, some network drives) don't update the
+            # modification time of a folder when a note is added to it, other
+            # files like canvases are never indexed
+            logging.debug("🗂️ Vault index outdated: %s not indexed", file_path)
+            vault_index = None
+        if vault_index is None:
+            markdown_files, directories, skipped_directories = walk_vault(vault_path)
+            note_titles = get_note_titles(markdown_files)
+            if not note_titles:
+                logging.error(
+                    f"🔴 No markdown files found in the vault: {vault_path}"
+                )
+                print(f"No markdown files found in the vault: {vault_path}")
+                return
+            sorted_titles, acronyms = prepare_titles(note_titles)
+            if skipped_directories:
+                # making a folder readable doesn't change the modification time
+                # of its parent, an index without its notes would never be
+                # found outdated
+                logging.debug("🗂️ Vault index not saved: folders were skipped")
+            else:
+                save_vault_index(
+                    vault_path, directories, markdown_files, sorted_titles, acronyms
+                )
+        else:
+            markdown_files, sorted_titles, acronyms = vault_index
+            logging.debug("🗂️ Vault index loaded")
+
+        if no_specified_file:
+            files_to_linkify_path = markdown_files
+        else:
+            files_to_linkify_path = [file_path]
 
         # to ensure the safety of the integrity of the vault we will
-        # make a dir as a backup of the files that will be modified
-        if safe_mode:
+        # make a dir as a backup of the files that will be modified,
+        # each file is saved there when it is read to be linkified
+        safe_filepath = None
+        if SAFE_MODE:
             safe_dir = f"backup_{vault_path.stem}"
             safe_filepath = vault_path.parent / safe_dir
             safe_filepath.mkdir(exist_ok=True)
 
             logging.info(f"📂 Safe directory: {safe_filepath}")
             print(f"Safe mode enabled, backup files will be stored in {safe_filepath}")
-            copy_files_to_somewhere_else(
-                safe_filepath, *files_to_linkify_path, encoding="utf-8"
-            )
+        # each note is backed up before it is written, so it can be written in
+        # place, which keeps its creation date; replacing it through a
+        # temporary file is only needed without a backup
+        write_in_place = safe_filepath is not None
 
-        logging.info(f"📚 Nb note titles: %s", len(note_titles))
-        nb_new_backlinks = 0
-        for file_to_linkify_path in files_to_linkify_path:
+        logging.info(f"📚 Nb note titles: %s", len(sorted_titles))
+        note_content = None
+        if not no_specified_file:
+            # for a single note, compiling all the titles of the vault would be most
+            # of the run, while only a few of them are in the note
             try:
-                with open(file_to_linkify_path, "r", encoding="utf-8") as file:
-                    text = file.read()
-
-                file_title = Path(file_to_linkify_path).stem
-                linkifiable_sections = split_text_for_linkification(text)
-                complete_linked_text = ""
-                for section, linkifiable in linkifiable_sections:
-                    if linkifiable:
-                        linked_text, nb_new_links = linkify_text(
-                            section, note_titles, file_title
-                        )
-                        complete_linked_text += linked_text
-                        nb_new_backlinks += nb_new_links
-                    else:
-                        complete_linked_text += section
-                new_file_path = vault_path / file_to_linkify_path.name
-                with open(new_file_path, "w", encoding="utf-8") as file:
-                    file.write(complete_linked_text)
-
-                logging.debug(f"🔗 Linkified file: {file_to_linkify_path.stem}")
-            except Exception as e:
-                logging.error(
-                    f"🔴 Error processing file {file_to_linkify_path.stem}: {e}"
+                note_content = file_path.read_bytes()
+                sorted_titles, acronyms = select_titles_in_text(
+                    note_content.decode("utf-8"), sorted_titles, acronyms
+                )
+                logging.debug("📚 Nb note titles in the note: %s", len(sorted_titles))
+            except (OSError, UnicodeDecodeError) as e:
+                logging.debug("🔴 Titles not filtered: %s", e)
+
+        if len(files_to_linkify_path) < MIN_FILES_FOR_PARALLELISM:
+            linkifier = build_linkifier(sorted_titles, acronyms)
+            if note_content is not None:
+                # the single note was already read to select its titles
+                linked_results = [
+                    linkify_file(
+                        file_path, linkifier, safe_filepath, vault_path, note_content
+                    )
+                ]
+            else:
+                linked_results = (
+                    linkify_file(
+                        file_to_linkify_path, linkifier, safe_filepath, vault_path
+                    )
+                    for file_to_linkify_path in files_to_linkify_path
+                )
+            nb_new_backlinks, written_files = write_linked_files(
+                files_to_linkify_path, linked_results, write_in_place
+            )
+        else:
+            # files are independent from each other, so they are linkified by
+            # worker processes, each one getting the note titles only once,
+            # while this process writes the results in order as they come
+            nb_workers = os.cpu_count() or 1
+            chunksize = max(1, len(files_to_linkify_path) // (4 * nb_workers))
+            with ProcessPoolExecutor(
+                initializer=init_worker,
+                initargs=(sorted_titles, acronyms, safe_filepath, vault_path),
+            ) as executor:
+                linked_results = executor.map(
+                    linkify_file_in_worker, files_to_linkify_path, chunksize=chunksize
+                )
+                nb_new_backlinks, written_files = write_linked_files(
+                    files_to_linkify_path, linked_results, write_in_place
                 )
-                print(f"Error processing file {file_to_linkify_path.stem}: {e}")
+
+        if written_files and not write_in_place:
+            refresh_vault_index(vault_path, written_files)
 
         logging.info(f"🔗 Total new backlinks: {nb_new_backlinks}")
         print(f"Script executed successfully")
@@ -330,9 +1020,8 @@ def main():
 
         logging.info("Note titles: %s", note_titles)
 
-        linked_text, nb_added_backlink = linkify_text(
-            test_text, note_titles, "Regression"
-        )
+        linkifier = build_linkifier(*prepare_titles(note_titles))
+        linked_text, nb_added_backlink = linkifier.apply(test_text, "Regression")
         logging.info("Linkified test text: %s", linked_text)
         logging.info("Nb new backlinks: %s", nb_added_backlink)
 
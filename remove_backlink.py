@@ -1,28 +1,14 @@
 import sys
 from pathlib import Path
 
-
-def get_markdown_files(vault_path: Path) -> list[Path]:
-    """
-    Get all markdown files in the vault.
-    """
-    markdown_files = list(vault_path.glob("**/*.md"))
-    # filter out dot folders like .obsidian
-    # both for Unix and Windows paths
-    markdown_files = [
-        file
-        for file in markdown_files
-        if not "/." in str(file) and not "\." in str(file)
-    ]
-    return markdown_files
+# the vault walking logic is shared with linkify.py, which must sit in the same folder
+from linkify import get_markdown_files
 
 
 def main():
     nb_args = len(sys.argv)
     obsidian_script_used = nb_args == 3
     no_specified_file = None
-    note_titles = None
-    safe_mode = True
 
     if obsidian_script_used:
         vault_path = Path(sys.argv[1])
@@ -43,11 +29,12 @@ def main():
             files_to_unbacklink = [file_path]
 
         for file in files_to_unbacklink:
-            with open(file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            with open(file, "w", encoding="utf-8") as f:
-                for line in lines:
-                    f.write(line.replace("[[", "").replace("]]", ""))
+            # the whole file is handled as bytes: "[[" and "]]" can't be part
+            # of another utf-8 character, and the line endings are kept
+            content = file.read_bytes()
+            unlinked_content = content.replace(b"[[", b"").replace(b"]]", b"")
+            if unlinked_content != content:
+                file.write_bytes(unlinked_content)
 
         print("Done")
     else:
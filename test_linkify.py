@@ -0,0 +1,159 @@
+import re
+import random
+
+import pytest
+
+from linkify import build_linkifier, prepare_titles, split_text_for_linkification
+
+# The pattern split_text_for_linkification used before its scanner, without the
+# table rows, which it matched across lines
+OLD_NOT_LINKIFIABLE_PATTERN = re.compile(
+    r"""
+        (```.*?```                     # Code blocks (```...```)
+        |(?<!`)\$\$.*?\$\$             # Multiline math blocks ($$...$$)
+        |(?<!`)\$.*?\$                 # Inline math blocks ($...$)
+        )
+    """,
+    flags=re.VERBOSE | re.MULTILINE | re.DOTALL,
+)
+
+
+def old_split(text: str) -> list[tuple[str, bool]]:
+    # re.split alternates the text between the matches and the matches
+    sections = OLD_NOT_LINKIFIABLE_PATTERN.split(text)
+    return [(section, i % 2 == 0) for i, section in enumerate(sections)]
+
+
+def merged(sections: list[tuple[str, bool]]) -> list[tuple[str, bool]]:
+    """
+    Drops the empty sections and merges the consecutive ones of the same kind,
+    so that two splits can be compared regardless of how they cut the text.
+    """
+    merged_sections = []
+    for section, linkifiable in sections:
+        if not section:
+            continue
+        if merged_sections and merged_sections[-1][1] == linkifiable:
+            merged_sections[-1] = (merged_sections[-1][0] + section, linkifiable)
+        else:
+            merged_sections.append((section, linkifiable))
+    return merged_sections
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "some ```code``` and text",
+        "```\nmulti\nline\n```\nafter",
+        "```a``` ```b```",
+        "math $$x^2$$ block",
+        "$$\nx\n$$",
+        "inline $x$ math and $y$",
+        "escaped `$x$` math",
+        "price $5 and $10",
+        "$$a$ b",
+        "```unclosed code",
+        "unclosed $ math",
+        "``` $x$ ```",
+        "$ ```code``` $",
+        "line\r\n$x$\r\n```\r\ncode\r\n```\r\n",
+        "",
+    ],
+)
+def test_split_matches_old_pattern(text):
+    sections = split_text_for_linkification(text)
+    assert "".join(section for section, _ in sections) == text
+    assert merged(sections) == merged(old_split(text))
+
+
+def test_split_matches_old_pattern_on_random_texts():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choices("`$a \n\r", k=rng.randrange(20)))
+        assert merged(split_text_for_linkification(text)) == merged(old_split(text))
+
+
+def test_split_table_rows():
+    text = "| a | b |\n|---|---|\ntext | not a row |\n| c | d |"
+    assert merged(split_text_for_linkification(text)) == [
+        ("| a | b |", False),
+        ("\n", True),
+        ("|---|---|", False),
+        ("\ntext | not a row |\n", True),
+        ("| c | d |", False),
+    ]
+
+
+def test_split_table_rows_one_line_at_a_time():
+    # the rows are not matched from the first line starting with "|" to the
+    # last one ending with it
+    text = "| not closed\nsome text\nends with |"
+    assert merged(split_text_for_linkification(text)) == [(text, True)]
+
+
+def test_split_table_rows_with_crlf():
+    text = "| a |\r\ntext\r\n| b |\r\n"
+    assert merged(split_text_for_linkification(text)) == [
+        ("| a |", False),
+        ("\r\ntext\r\n", True),
+        ("| b |", False),
+        ("\r\n", True),
+    ]
+
+
+def test_split_unclosed_markers():
+    text = "```never closed\n| nor this\nand $ this"
+    assert merged(split_text_for_linkification(text)) == [(text, True)]
+
+
+def linkify(titles: list[str], text: str, file_title=None) -> tuple[str, int]:
+    sorted_titles, acronyms = prepare_titles(titles)
+    return build_linkifier(sorted_titles, acronyms).apply(text, file_title)
+
+
+def test_apply_plurals():
+    assert linkify(["Note"], "Notes and notes, not Notess") == (
+        "[[Note]]s and [[Note|note]]s, not Notess",
+        2,
+    )
+
+
+def test_apply_prefers_longest_title():
+    assert linkify(["Machine", "Machine learning"], "machine learning") == (
+        "[[Machine learning|machine learning]]",
+        1,
+    )
+
+
+def test_apply_keeps_existing_links():
+    text = "[[Note]] [[Notes]] [[Note|a note]] [[Other]]s"
+    assert linkify(["Note", "Other"], text) == (text, 0)
+
+
+def test_apply_skips_current_note():
+    assert linkify(["Note"], "Note", file_title="Note") == ("Note", 0)
+
+
+def test_apply_acronyms_keep_their_case():
+    text = "ML, MLs, MLS and ml"
+    assert linkify(["Machine learning"], text) == (
+        "[[Machine learning|ML]], [[Machine learning|ML]]s, MLS and ml",
+        2,
+    )
+
+
+def test_apply_long_s():
+    # "ſ" matches "s" regardless of case, but isn't the title lowercased
+    assert linkify(["Sun"], "ſun and Sun") == ("ſun and [[Sun]]", 1)
+
+
+def test_apply_without_acronyms():
+    # the pattern has no acronym group when the vault has no acronyms
+    assert linkify(["Note", "Todo"], "a note, todos") == (
+        "a [[Note|note]], [[Todo|todo]]s",
+        2,
+    )
+
+
+def test_apply_accents():
+    assert linkify(["Regression"], "régression") == ("[[Regression|régression]]", 1)